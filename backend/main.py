@@ -7,7 +7,10 @@ from io import BytesIO
 from typing import List
 from typing import List
 import asyncio 
-from fastapi import FastAPI, Request, HTTPException, Body, BackgroundTasks
+import shutil
+import time
+import uuid
+from fastapi import FastAPI, Request, HTTPException, Body, BackgroundTasks, UploadFile, File, Form
 from fastapi.responses import RedirectResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from google_auth_oauthlib.flow import Flow
@@ -18,6 +21,12 @@ import google.auth.transport.requests
 from fpdf import FPDF
 from PIL import Image
 from services.gemini_service import GeminiOCR
+from services.job_store import get_job_store, TERMINAL_STATUSES
+from services.memory_budget import get_memory_budget
+from services.pdf_compression import PDF_PROFILES, resolve_profiles, add_page, write_pdf
+from services.preview import fetch_thumbnails, estimate_ocr, DEFAULT_THUMBNAIL_SIZE, MIN_THUMBNAIL_SIZE, MAX_THUMBNAIL_SIZE
+from services.image_sources import ImageSource, SourcePage, open_local_source, natural_keys, is_image_name, ARCHIVE_EXTENSIONS
+from worker import start_worker_pool, stop_worker_pool, MEMORY_STATS_PREFIX, MEMORY_STATS_STALE_SECONDS
 import zipfile
 import io
 import logging
@@ -36,19 +45,21 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # Allow insecure transport for local development (http instead of https)
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-# Global executor to be managed by lifespan
-process_executor = None
+# Conversions run in worker processes (see worker.py) that pull jobs from the
+# shared job store. For single-node dev the API spawns EMBEDDED_WORKERS of them
+# itself; set EMBEDDED_WORKERS=0 when running `python worker.py` separately
+# (required with `uvicorn --workers N` or multiple replicas).
+EMBEDDED_WORKERS = int(os.getenv("EMBEDDED_WORKERS", "1"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global process_executor
-    # Increased workers to support parallel batch processing within tasks (Paid Tier: 100)
-    process_executor = ThreadPoolExecutor(max_workers=100)
+    get_job_store()  # Create schema before any worker races for it
+    workers = start_worker_pool(EMBEDDED_WORKERS) if EMBEDDED_WORKERS > 0 else []
     yield
     # Shutdown
-    print("Shutting down executor...")
-    process_executor.shutdown(wait=False, cancel_futures=True)
+    print("Shutting down workers...")
+    stop_worker_pool(workers)
 
 app = FastAPI(lifespan=lifespan)
 
@@ -65,8 +76,8 @@ CLIENT_SECRET_FILE = 'client_secret.json'
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 REDIRECT_URI = 'http://localhost:8000/auth/callback'
 
-# Global store for tokens
-user_tokens = {}
+# OAuth tokens live in the job store so every API and worker process sees them
+TOKEN_KEY = "user_tokens:default"
 
 def get_flow():
     return Flow.from_client_secrets_file(
@@ -75,11 +86,12 @@ def get_flow():
         redirect_uri=REDIRECT_URI
     )
 
-def get_drive_service():
-    if 'default' not in user_tokens:
+def get_drive_credentials():
+    store = get_job_store()
+    token_info = store.get_value(TOKEN_KEY)
+    if not token_info:
         return None
     
-    token_info = user_tokens['default']
     credentials = Credentials(
         token=token_info['token'],
         refresh_token=token_info.get('refresh_token'),
@@ -95,9 +107,33 @@ def get_drive_service():
         credentials.refresh(request)
         # Update our store
         token_info['token'] = credentials.token
+        store.set_value(TOKEN_KEY, token_info)
     
+    return credentials
+
+def get_drive_service():
+    credentials = get_drive_credentials()
+    if not credentials:
+        return None
     return build('drive', 'v3', credentials=credentials)
 
+def list_drive_images(service, folder_id, fields="id, name, mimeType"):
+    """All images in a Drive folder, following nextPageToken past the 100-file page limit."""
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=f"'{folder_id}' in parents and mimeType contains 'image/' and trashed = false",
+            pageSize=100,
+            fields=f"nextPageToken, files({fields})",
+            orderBy="name",
+            pageToken=page_token
+        ).execute()
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files
+
 def extract_folder_id(url: str):
     # Matches /folders/ID or ?id=ID
     match = re.search(r'folders/([a-zA-Z0-9_-]+)', url)
@@ -120,7 +156,7 @@ def login():
 
 @app.get("/auth/logout")
 def logout():
-    user_tokens.clear()
+    get_job_store().delete_value(TOKEN_KEY)
     return {"status": "logged_out"}
 
 @app.get("/auth/callback")
@@ -133,32 +169,26 @@ async def callback(request: Request):
     flow.fetch_token(code=code)
     
     credentials = flow.credentials
-    user_tokens['default'] = {
+    get_job_store().set_value(TOKEN_KEY, {
         'token': credentials.token,
         'refresh_token': credentials.refresh_token,
         'token_uri': credentials.token_uri,
         'client_id': credentials.client_id,
         'client_secret': credentials.client_secret,
         'scopes': credentials.scopes
-    }
+    })
     return RedirectResponse(url="http://localhost:5173?status=success")
 
 @app.get("/api/user")
 def get_user():
-    if 'default' not in user_tokens:
+    if not get_job_store().get_value(TOKEN_KEY):
         return {"logged_in": False}
     return {"logged_in": True}
 
-async def download_images_from_folder(service, folder_id, tmp_dir):
+async def download_images_from_folder(job, service, folder_id, tmp_dir):
     """Refactored helper to list and download images."""
     logger.info(f"Listing files in folder: {folder_id}")
-    results = service.files().list(
-        q=f"'{folder_id}' in parents and mimeType contains 'image/'",
-        pageSize=100,
-        fields="files(id, name, mimeType)",
-        orderBy="name"
-    ).execute()
-    files = results.get('files', [])
+    files = list_drive_images(service, folder_id)
     
     logger.info(f"Found {len(files)} images in Drive folder.")
     if not files:
@@ -169,7 +199,7 @@ async def download_images_from_folder(service, folder_id, tmp_dir):
     
     for i, file_meta in enumerate(files):
         # Check cancellation
-        if cancel_event.is_set():
+        if job.is_cancelled():
             logger.warning("Download cancelled by user.")
             return None
 
@@ -190,7 +220,7 @@ async def download_images_from_folder(service, folder_id, tmp_dir):
         
         # Update global progress (Approximation: 10% scanning + 70% downloading)
         percent = 10 + int((i / total_files) * 70)
-        current_progress.update({
+        job.update({
             "status": "processing",
             "percent": percent,
             "message": f"Downloading {i+1}/{total_files}: {file_meta['name']}"
@@ -199,80 +229,217 @@ async def download_images_from_folder(service, folder_id, tmp_dir):
     logger.info(f"Download complete. {len(downloaded_files)} files saved to {tmp_dir}")
     return downloaded_files
 
-import asyncio
-from fastapi.responses import StreamingResponse
+class DriveFolderSource(ImageSource):
+    """Google Drive folder; the only source whose pages are downloaded to tmp_dir first."""
+
+    def __init__(self, service, folder_id):
+        self.service = service
+        self.folder_id = folder_id
+
+    def collect(self, job, tmp_dir):
+        downloaded_files = asyncio.run(download_images_from_folder(job, self.service, self.folder_id, tmp_dir))
+        if downloaded_files is None: # Cancelled
+            return None
+        pages = [SourcePage(f["name"], path=f["path"]) for f in downloaded_files]
+        # Drive's orderBy=name is lexical (page1, page10, page2); match the other sources
+        pages.sort(key=lambda p: natural_keys(p.name))
+        return pages
+
+# Client-supplied local/archive paths must live under this directory.
+# Unset means only Drive and uploads are accepted.
+LOCAL_SOURCE_ROOT = os.getenv("LOCAL_SOURCE_ROOT")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+
+def build_image_source(payload):
+    """Image source for a job payload: {"url": ...} (Drive) or {"source": {"type", "path"}}."""
+    spec = payload.get("source") or {"type": "drive", "url": payload["url"]}
+    if spec["type"] == "drive":
+        service = get_drive_service()
+        if not service:
+            return None
+        return DriveFolderSource(service, extract_folder_id(spec["url"]))
+    return open_local_source(spec)
+
+def validate_source_payload(payload):
+    """Job payload fields describing where the pages come from (raises 400 if unusable)."""
+    source = payload.get("source")
+    if not source:
+        if not payload.get("url"):
+            raise HTTPException(status_code=400, detail="URL is required")
+        return {"url": payload["url"]}
+    
+    if source.get("type") not in ("local", "archive") or not source.get("path"):
+        raise HTTPException(status_code=400, detail="Source must be {type: local|archive, path}")
+    if not LOCAL_SOURCE_ROOT:
+        raise HTTPException(status_code=400, detail="Local sources are disabled (LOCAL_SOURCE_ROOT not set)")
+    root = os.path.realpath(LOCAL_SOURCE_ROOT)
+    path = os.path.realpath(os.path.join(root, source["path"]))
+    if os.path.commonpath([root, path]) != root:
+        raise HTTPException(status_code=400, detail="Source path is outside LOCAL_SOURCE_ROOT")
+    return {"source": {"type": source["type"], "path": path}}
 
 import threading
 
-# Global progress and cancellation
-current_progress = {"status": "idle", "percent": 0, "message": ""}
-cancel_event = threading.Event()
+IDLE_PROGRESS = {"status": "idle", "percent": 0, "message": ""}
+
+def resolve_job(job_id=None):
+    """Look up a job by id, or the most recent job when the client doesn't send one."""
+    store = get_job_store()
+    return store.get_job(job_id) if job_id else store.latest_job()
+
+def job_progress(job):
+    if job is None:
+        return dict(IDLE_PROGRESS)
+    return {"job_id": job["id"], "status": job["status"], "percent": job["percent"], "message": job["message"]}
+
+# Fail a job no worker has picked up within QUEUE_TIMEOUT (e.g. EMBEDDED_WORKERS=0
+# and no worker.py running); stop waiting on a running job after JOB_WAIT_TIMEOUT
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "120"))
+JOB_WAIT_TIMEOUT = float(os.getenv("JOB_WAIT_TIMEOUT", "3600"))
+
+async def enqueue_and_wait(kind, payload, wait=True):
+    """Queue a job for the worker pool; optionally wait (without blocking the loop) for its result."""
+    # Store calls can wait on SQLite's write lock; keep them off the event loop
+    store = get_job_store()
+    job_id = await asyncio.to_thread(store.create_job, kind, payload)
+    if not wait:
+        return {"success": True, "job_id": job_id}
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    while True:
+        # Also catches jobs whose worker died while we were waiting
+        await asyncio.to_thread(store.recover_stale_jobs)
+        job = await asyncio.to_thread(store.get_job, job_id)
+        if job["result"] is not None:
+            return {**job["result"], "job_id": job_id}
+        
+        # updated_at also resets when a lost job is re-queued
+        if job["status"] == "queued" and time.time() - job["updated_at"] > QUEUE_TIMEOUT:
+            error = "No worker picked up the job; is a worker running?"
+            if await asyncio.to_thread(store.fail_if_queued, job_id, error):
+                return {"success": False, "error": error, "job_id": job_id}
+        if loop.time() - started > JOB_WAIT_TIMEOUT:
+            # The job keeps running; the client can follow it by job_id
+            return {"success": False, "error": "Timed out waiting for the job", "job_id": job_id}
+        await asyncio.sleep(0.5)
 
 @app.get("/api/progress")
-async def progress_stream():
+async def progress_stream(job_id: str = None):
     async def event_generator():
         while True:
-            if current_progress["status"] == "complete" or current_progress["status"] == "error" or current_progress["status"] == "cancelled":
-                yield f"data: {json.dumps(current_progress)}\n\n"
+            # Expire jobs of dead workers so the stream can't follow them forever
+            await asyncio.to_thread(get_job_store().recover_stale_jobs)
+            # Without a job_id, follow whichever job was submitted last
+            progress = job_progress(await asyncio.to_thread(resolve_job, job_id))
+            if progress["status"] in TERMINAL_STATUSES:
+                yield f"data: {json.dumps(progress)}\n\n"
                 break
-            yield f"data: {json.dumps(current_progress)}\n\n"
+            yield f"data: {json.dumps(progress)}\n\n"
             await asyncio.sleep(0.5)
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 @app.post("/api/cancel")
-def cancel_process():
-    if current_progress["status"] == "processing" or current_progress["status"] == "starting":
-        cancel_event.set()
-        current_progress.update({"status": "cancelled", "message": "Cancelling..."})
+def cancel_process(job_id: str = None):
+    job = resolve_job(job_id)
+    if job and job["status"] in ("queued", "starting", "processing"):
+        store = get_job_store()
+        store.request_cancel(job["id"])
+        store.update_progress(job["id"], {"message": "Cancelling..."})
     return {"status": "ok"}
 
+@app.post("/api/preview")
+async def preview_folder(payload: dict = Body(...)):
+    """
+    Dry run: list every page in naturally sorted order with low-res Drive
+    thumbnails, size totals and an OCR cost/runtime estimate, without
+    downloading any full image.
+    """
+    url = payload.get("url")
+    if not url:
+        raise HTTPException(status_code=400, detail="URL is required")
+    try:
+        thumbnail_size = int(payload.get("thumbnail_size", DEFAULT_THUMBNAIL_SIZE))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="thumbnail_size must be an integer")
+    # This is a low-res preview; never pull near-full-size renditions into the response
+    thumbnail_size = max(MIN_THUMBNAIL_SIZE, min(thumbnail_size, MAX_THUMBNAIL_SIZE))
+    
+    # Reads the token from the store and may refresh it over the network
+    credentials = await asyncio.to_thread(get_drive_credentials)
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    def build_preview():
+        service = build('drive', 'v3', credentials=credentials)
+        folder_id = extract_folder_id(url)
+        files = list_drive_images(
+            service, folder_id,
+            fields="id, name, mimeType, size, thumbnailLink, imageMediaMetadata(width, height)"
+        )
+        # Same order DriveFolderSource gives the PDF and OCR pipelines
+        files.sort(key=lambda f: natural_keys(f['name']))
+        thumbnails = fetch_thumbnails(files, credentials.token, thumbnail_size) if payload.get("thumbnails", True) else {}
+        
+        pages = []
+        for i, f in enumerate(files):
+            metadata = f.get('imageMediaMetadata', {})
+            pages.append({
+                "index": i + 1,
+                "id": f['id'],
+                "name": f['name'],
+                "mime_type": f['mimeType'],
+                "size": int(f.get('size', 0)),
+                "width": metadata.get('width'),
+                "height": metadata.get('height'),
+                "thumbnail": thumbnails.get(f['id']),
+            })
+        total_bytes = sum(p["size"] for p in pages)
+        return {
+            "folder_id": folder_id,
+            "page_count": len(pages),
+            "total_bytes": total_bytes,
+            "pages": pages,
+            "estimate": estimate_ocr(len(pages), total_bytes),
+        }
+    
+    # Drive calls block; keep them off the event loop
+    return await asyncio.to_thread(build_preview)
+
 @app.post("/api/ocr/convert")
 async def convert_ocr(payload: dict = Body(...)):
-    url = payload.get("url")
     api_key = payload.get("api_key")
-    
-    if not url or not api_key:
+    if not api_key:
         raise HTTPException(status_code=400, detail="URL and Gemini API Key are required")
-        
-    cancel_event.clear()
-    current_progress.update({"status": "starting", "percent": 0, "message": "Initializing OCR..."})
     
-    loop = asyncio.get_event_loop()
-    # Use the global executor managed by lifespan
-    return await loop.run_in_executor(process_executor, process_ocr_conversion, url, api_key)
+    job_payload = {**validate_source_payload(payload), "api_key": api_key}
+    return await enqueue_and_wait("ocr", job_payload, payload.get("wait", True))
 
-def process_ocr_conversion(url, api_key):
+def process_ocr_conversion(job, payload):
     try:
-        if cancel_event.is_set(): raise Exception("Cancelled")
+        if job.is_cancelled(): raise Exception("Cancelled")
         
-        service = get_drive_service()
-        if not service:
-             current_progress.update({"status": "error", "message": "Auth failed"})
+        source = build_image_source(payload)
+        if not source:
+             job.update({"status": "error", "message": "Auth failed"})
              return {"success": False, "error": "Not authenticated"}
 
-        folder_id = extract_folder_id(url)
-        current_progress.update({"status": "processing", "percent": 5, "message": "Scanning folder..."})
+        api_key = payload["api_key"]
+        job.update({"status": "processing", "percent": 5, "message": "Scanning folder..."})
         
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            # Reusing the helper logic
-            downloaded_files = asyncio.run(download_images_from_folder(service, folder_id, tmp_dir)) \
-                if asyncio.iscoroutinefunction(download_images_from_folder) else download_images_from_folder(service, folder_id, tmp_dir)
+        with tempfile.TemporaryDirectory() as tmp_dir, source:
+            pages = source.collect(job, tmp_dir)
             
-            if downloaded_files is None: # Cancelled
+            if pages is None: # Cancelled
                 raise Exception("Cancelled by user")
             
-            if not downloaded_files:
+            if not pages:
                 return {"success": False, "error": "No images found"}
 
             # NATURAL SORT: Critical for seamless text!
             # We must ensure Page 1 -> Page 2 -> Page 10 (not 1 -> 10 -> 2)
-            import re
-            def natural_keys(item):
-                text = item['name']
-                return [int(c) if c.isdigit() else c.lower() for c in re.split(r'(\d+)', text)]
-            
-            downloaded_files.sort(key=natural_keys)
-            logger.info(f"Sorted {len(downloaded_files)} files naturally.")
+            pages.sort(key=lambda page: natural_keys(page.name))
+            logger.info(f"Sorted {len(pages)} files naturally.")
             
             # Parallel Processing
             gemini = GeminiOCR(api_key) 
@@ -282,7 +449,7 @@ def process_ocr_conversion(url, api_key):
             # - For quality, each batch should have at least 1 image
             # - Prefer more batches (faster) over larger batches (better context)
             # - Max 100 concurrent batches (Paid Tier limit)
-            total_files = len(downloaded_files)
+            total_files = len(pages)
             target_concurrency = min(100, total_files)  # Max 100 batches or 1 batch per file
             
             # Calculate roughly equal chunk sizes
@@ -294,7 +461,7 @@ def process_ocr_conversion(url, api_key):
                 # Distribute remainder one by one
                 chunk_size = k + 1 if i < m else k
                 end_idx = start_idx + chunk_size
-                file_batches.append(downloaded_files[start_idx:end_idx])
+                file_batches.append(pages[start_idx:end_idx])
                 start_idx = end_idx
                 
             total_batches = len(file_batches)
@@ -305,26 +472,36 @@ def process_ocr_conversion(url, api_key):
             lock = threading.Lock()
             results = [None] * total_batches
 
+            budget = get_memory_budget()
+
             def process_batch_wrapper(b_idx, batch_files):
-                if cancel_event.is_set(): return None
+                if job.is_cancelled(): return None
                 
                 images_opened = []
+                streams_opened = []
                 try:
-                    for f in batch_files:
-                        img = Image.open(f["path"])
-                        images_opened.append(img)
-                    
-                    if not images_opened: return ""
-
-                    # We won't use granular char streaming updates here to avoid lock contention
-                    # Instead we update on completion
-                    text = gemini.transcribe_batch(images_opened, cancel_callback=lambda: cancel_event.is_set())
-                    return text
+                    # Wait for room in the process-wide decode budget before
+                    # opening anything; the whole batch is held during the request
+                    with budget.reserve(batch_files, cancel_callback=job.is_cancelled) as admitted:
+                        if not admitted: return None
+
+                        for page in batch_files:
+                            stream = page.open()
+                            streams_opened.append(stream)
+                            images_opened.append(Image.open(stream))
+                        
+                        if not images_opened: return ""
+
+                        # We won't use granular char streaming updates here to avoid lock contention
+                        # Instead we update on completion
+                        text = gemini.transcribe_batch(images_opened, cancel_callback=lambda: job.is_cancelled())
+                        return text
                 except Exception as e:
                     logger.error(f"Batch {b_idx} failed: {e}")
                     raise e
                 finally:
                     for img in images_opened: img.close()
+                    for stream in streams_opened: stream.close()
 
             # Execute batches in parallel
             # Max workers = 100 (Paid Tier)
@@ -346,7 +523,7 @@ def process_ocr_conversion(url, api_key):
                         with lock:
                             completed_batches += 1
                             percent = 80 + int((completed_batches / total_batches) * 15)
-                            current_progress.update({
+                            job.update({
                                 "status": "processing",
                                 "percent": percent,
                                 "message": f"Analyzing... Completed Batch {completed_batches}/{total_batches}"
@@ -363,13 +540,13 @@ def process_ocr_conversion(url, api_key):
                 if res:
                     full_text += res + "\n"
             
-            # Post-processing: Create timestamped folder with text files
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_dir = f"results/ocr_{timestamp}"
-            os.makedirs(output_dir, exist_ok=True)
+            # Post-processing: one folder of text files per job (workers run concurrently)
+            output_dir = f"results/ocr_{job.job_id}"
+            # A re-queued attempt starts over; don't mix in an earlier attempt's chapters
+            shutil.rmtree(output_dir, ignore_errors=True)
+            os.makedirs(output_dir)
             
-            current_progress.update({"status": "processing", "percent": 99, "message": "Saving results..."})
+            job.update({"status": "processing", "percent": 99, "message": "Saving results..."})
             logger.info(f"Creating output directory: {output_dir}")
             
             # Split by chapter if detected, with deduplication
@@ -425,128 +602,192 @@ def process_ocr_conversion(url, api_key):
             logger.info(f"Results saved to folder: {output_dir}")
             logger.info(f"Download ZIP created: {output_zip}")
             
-        current_progress.update({"status": "complete", "percent": 100, "message": "OCR Complete!"})
-        return {"success": True, "download_url": "/api/download"} # We can reuse download endpoint if we overwrite output file or make endpoint dynamic
+        job.update({"status": "complete", "percent": 100, "message": "OCR Complete!"})
+        return {"success": True, "download_url": f"/api/download?job_id={job.job_id}", "output_path": output_zip}
         
     except Exception as e:
-        current_progress.update({"status": "error", "message": str(e)})
+        job.update({"status": "error", "message": str(e)})
         return {"success": False, "error": str(e)}
 
 @app.post("/api/convert")
-async def convert_folder(payload: dict = Body(...), background_tasks: BackgroundTasks = None):
-    # Note: For SSE to work well, conversion should ideally be a background task
-    # For this simple synchronous flow, we will update the global variable
-    # and use asyncio.to_thread in a real async app. 
-    # Here we'll just update the variable synchronously which might block main thread
-    # So we should refactor to run heavy lifting in a separate thread.
+async def convert_folder(payload: dict = Body(...)):
+    try:
+        profiles = resolve_profiles(payload.get("profiles") or payload.get("profile"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    from concurrent.futures import ThreadPoolExecutor
-    executor = ThreadPoolExecutor(max_workers=1)
+    # Heavy lifting happens in a worker process; this only queues and waits
+    job_payload = {**validate_source_payload(payload), "profiles": profiles}
+    return await enqueue_and_wait("pdf", job_payload, payload.get("wait", True))
+
+@app.post("/api/upload/convert")
+async def convert_upload(
+    files: List[UploadFile] = File(...),
+    mode: str = Form("pdf"),
+    api_key: str = Form(None),
+    profile: str = Form(None),
+    wait: bool = Form(True),
+):
+    """
+    Convert pages uploaded directly: either loose images or a single ZIP/CBZ.
+
+    python-multipart spools large parts to disk; we stream each spool into a
+    per-upload directory the worker processes can see. Archives are stored
+    as-is and read in place by the worker, never extracted.
+    """
+    if mode not in ("pdf", "ocr"):
+        raise HTTPException(status_code=400, detail="Mode must be pdf or ocr")
+    if mode == "ocr" and not api_key:
+        raise HTTPException(status_code=400, detail="Gemini API Key is required")
+    try:
+        # Comma-separated to request several renditions
+        profiles = resolve_profiles(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    url = payload.get("url")
-    if not url:
-        raise HTTPException(status_code=400, detail="URL is required")
+    upload_dir = os.path.join(UPLOAD_DIR, uuid.uuid4().hex)
+    os.makedirs(upload_dir)
+    saved = []
+    try:
+        for upload in files:
+            name = os.path.basename(upload.filename or "")
+            if not name or not (is_image_name(name) or name.lower().endswith(ARCHIVE_EXTENSIONS)):
+                continue
+            path = os.path.join(upload_dir, name)
+            # Same basename from different client folders would silently replace a page
+            if path in saved:
+                raise HTTPException(status_code=400, detail=f"Duplicate file name: {name}")
+            with open(path, "wb") as out:
+                await asyncio.to_thread(shutil.copyfileobj, upload.file, out, 1024 * 1024)
+            saved.append(path)
+    except BaseException:
+        # Disconnect, full disk, bad request: nothing will ever claim these files
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
     
-    # Reset state
-    cancel_event.clear()
-    current_progress.update({"status": "starting", "percent": 0, "message": "Initializing..."})
+    archives = [p for p in saved if p.lower().endswith(ARCHIVE_EXTENSIONS)]
+    if not saved or (archives and len(saved) > 1):
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="Upload either image files or a single ZIP/CBZ archive")
     
-    loop = asyncio.get_event_loop()
-    # Run in separate thread to not block the progress endpoint
-    return await loop.run_in_executor(executor, process_conversion, url)
-
-def process_conversion(url):
+    if archives:
+        source = {"type": "archive", "path": os.path.abspath(archives[0])}
+    else:
+        source = {"type": "local", "path": os.path.abspath(upload_dir)}
+    job_payload = {"source": source, "cleanup_path": os.path.abspath(upload_dir)}
+    if mode == "ocr":
+        job_payload["api_key"] = api_key
+    else:
+        job_payload["profiles"] = profiles
+    return await enqueue_and_wait(mode, job_payload, wait)
+
+def process_conversion(job, payload):
     try:
-        if cancel_event.is_set(): 
-            current_progress.update({"status": "cancelled", "message": "Operation cancelled before start"})
+        if job.is_cancelled(): 
+            job.update({"status": "cancelled", "message": "Operation cancelled before start"})
             return {"success": False, "error": "Cancelled by user"}
 
-        service = get_drive_service()
-        if not service:
-             current_progress.update({"status": "error", "message": "Auth failed"})
+        source = build_image_source(payload)
+        if not source:
+             job.update({"status": "error", "message": "Auth failed"})
              return {"success": False, "error": "Not authenticated"}
 
-        folder_id = extract_folder_id(url)
-        current_progress.update({"status": "processing", "percent": 5, "message": "Scanning folder..."})
-        
-        results = service.files().list(
-            q=f"'{folder_id}' in parents and mimeType contains 'image/'",
-            pageSize=100,
-            fields="files(id, name, mimeType)",
-            orderBy="name"
-        ).execute()
-        files = results.get('files', [])
+        job.update({"status": "processing", "percent": 5, "message": "Scanning folder..."})
         
-        if not files:
-            current_progress.update({"status": "error", "message": "No images found"})
-            return {"success": False, "error": "No images found"}
+        with tempfile.TemporaryDirectory() as tmp_dir, source:
+            pages = source.collect(job, tmp_dir)
             
-        total_files = len(files)
-        current_progress.update({"status": "processing", "percent": 10, "message": f"Found {total_files} images. Starting download..."})
-
-        pdf = FPDF()
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            # Reusing the helper logic
-            downloaded_files = asyncio.run(download_images_from_folder(service, folder_id, tmp_dir))
-            
-            if downloaded_files is None: # Cancelled
+            if pages is None: # Cancelled
                 raise Exception("Cancelled by user")
             
-            if not downloaded_files:
+            if not pages:
+                job.update({"status": "error", "message": "No images found"})
                 return {"success": False, "error": "No images found in folder"}
 
-            # 2. PDF Generation
-            pdf = FPDF()
-            total_files = len(downloaded_files)
+            # 2. PDF Generation: one document per requested compression profile
+            profiles = resolve_profiles(payload.get("profiles"))
+            targets = [(FPDF(), PDF_PROFILES[name]) for name in profiles]
+            total_files = len(pages)
+            budget = get_memory_budget()
             
-            for i, f_info in enumerate(downloaded_files):
+            for i, page in enumerate(pages):
                 # Check cancellation
-                if cancel_event.is_set():
-                    current_progress.update({"status": "cancelled", "message": "Operation cancelled by user"})
+                if job.is_cancelled():
+                    job.update({"status": "cancelled", "message": "Operation cancelled by user"})
                     return {"success": False, "error": "Cancelled by user"}
                 
                 # Update progress (PDF generation phase: 80% to 95%)
                 percent = 80 + int((i / total_files) * 15)
-                current_progress.update({
+                job.update({
                     "status": "processing",
                     "percent": percent,
                     "message": f"Generating PDF page {i+1}/{total_files}..."
                 })
                 
-                tmp_path = f_info["path"]
                 try:
-                    img = Image.open(tmp_path)
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    pdf.add_page()
-                    pdf.image(tmp_path, x=0, y=0, w=210)
+                    with budget.reserve([page], cancel_callback=job.is_cancelled) as admitted:
+                        if not admitted:
+                            continue  # Cancelled; caught at the top of the next iteration
+                        add_page(targets, page)
                 except Exception as e:
-                    print(f"Skipping {f_info['name']}: {e}")
+                    print(f"Skipping {page.name}: {e}")
             
-            current_progress.update({"status": "processing", "percent": 98, "message": "Saving PDF..."})
-            output_path = "output_ebook.pdf"
-            pdf.output(output_path, "F")
+            job.update({"status": "processing", "percent": 98, "message": "Saving PDF..."})
+            os.makedirs("results", exist_ok=True)
+            source_bytes = sum(page.size or 0 for page in pages)
+            outputs = {}
+            for name, (pdf, profile) in zip(profiles, targets):
+                output_path = f"results/ebook_{job.job_id}_{name}.pdf"
+                output_bytes = write_pdf(pdf, output_path, profile)
+                outputs[name] = {"output_path": output_path, "output_bytes": output_bytes}
+                logger.info(f"PDF profile '{name}': {output_bytes} bytes (source images: {source_bytes} bytes)")
             
-        current_progress.update({"status": "complete", "percent": 100, "message": "Done!"})
-        return {"success": True, "download_url": "/api/download"}
+        job.update({"status": "complete", "percent": 100, "message": "Done!"})
+        return {
+            "success": True,
+            "download_url": f"/api/download?job_id={job.job_id}",
+            # First requested profile is the default download
+            "output_path": outputs[profiles[0]]["output_path"],
+            "outputs": outputs,
+            "output_sizes": {name: out["output_bytes"] for name, out in outputs.items()},
+            "source_bytes": source_bytes,
+        }
 
     except Exception as e:
-        current_progress.update({"status": "error", "message": str(e)})
+        job.update({"status": "error", "message": str(e)})
         return {"success": False, "error": str(e)}
 
 @app.get("/api/download")
-def download_ebook():
-    # Check for latest OCR result ZIP in results/ folder
-    import glob
-    ocr_zips = glob.glob("results/ocr_*.zip")
-    if ocr_zips:
-        latest_zip = max(ocr_zips, key=os.path.getmtime)
-        return FileResponse(latest_zip, media_type="application/zip", filename=os.path.basename(latest_zip))
+def download_ebook(job_id: str = None, profile: str = None):
+    # Result locations come from the job store, not from whichever files
+    # happen to be in this process's working directory
+    store = get_job_store()
+    job = store.get_job(job_id) if job_id else store.latest_job(status="complete")
+    result = (job or {}).get("result") or {}
+    output_path = result.get("output_path")
+    if profile:
+        output_path = result.get("outputs", {}).get(profile, {}).get("output_path")
+    if not output_path or not os.path.exists(output_path):
+        raise HTTPException(status_code=404, detail="File not found")
     
-    # Fallback to PDF if exists
-    if os.path.exists("output_ebook.pdf"):
-        return FileResponse("output_ebook.pdf", media_type="application/pdf", filename="your_ebook.pdf")
-    raise HTTPException(status_code=404, detail="File not found")
+    if output_path.endswith(".zip"):
+        return FileResponse(output_path, media_type="application/zip", filename=os.path.basename(output_path))
+    return FileResponse(output_path, media_type="application/pdf", filename="your_ebook.pdf")
+
+@app.get("/api/memory")
+def memory_budget_usage():
+    # Each worker process publishes its own decoded-image budget to the store;
+    # entries not refreshed recently belong to workers that died uncleanly
+    cutoff = time.time() - MEMORY_STATS_STALE_SECONDS
+    workers = {
+        key: stats for key, stats in get_job_store().list_values(MEMORY_STATS_PREFIX).items()
+        if stats.get("updated_at", 0) >= cutoff
+    }
+    return {
+        "workers": {key[len(MEMORY_STATS_PREFIX):]: stats for key, stats in workers.items()},
+        "in_use_bytes": sum(stats["in_use_bytes"] for stats in workers.values()),
+        "budget_bytes": sum(stats["budget_bytes"] for stats in workers.values()),
+    }
 
 @app.get("/")
 def read_root():
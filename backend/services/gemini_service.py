@@ -10,7 +10,8 @@ class GeminiOCR:
         # Using the experimental flash model or the latest stable flash
         self.model = genai.GenerativeModel('gemini-3-flash-preview')
 
-    def generate_prompt(self):
+    @staticmethod
+    def generate_prompt():
         return """
 You are a professional book transcribing agent using advanced vision and reasoning. 
 Your goal is to extract text from the provided sequence of book pages and convert them into a single, clean, flowable text.
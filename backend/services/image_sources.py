@@ -0,0 +1,128 @@
+import os
+import re
+import zipfile
+from typing import BinaryIO, List, Optional
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+ARCHIVE_EXTENSIONS = ('.zip', '.cbz')
+
+
+def natural_keys(name: str):
+    # Page 1 -> Page 2 -> Page 10 (not 1 -> 10 -> 2)
+    return [int(c) if c.isdigit() else c.lower() for c in re.split(r'(\d+)', name)]
+
+
+def is_image_name(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class SourcePage:
+    """
+    One page image, wherever it lives.
+
+    Pipelines only ever call open() and read the returned binary stream, so a
+    page can be a file on disk or a member inside an archive without being
+    copied out first.
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, opener=None, size: Optional[int] = None):
+        self.name = name
+        self.path = path
+        self.size = size if size is not None else (os.path.getsize(path) if path else None)
+        self._opener = opener
+
+    def open(self) -> BinaryIO:
+        if self._opener:
+            return self._opener()
+        return open(self.path, "rb")
+
+    def __repr__(self):
+        return f"SourcePage({self.name!r})"
+
+
+class ImageSource:
+    """
+    Where a job's pages come from (Drive folder, local directory, ZIP/CBZ...).
+
+    collect() returns the pages (naturally sorted unless the source defines its
+    own order), or None if the job was cancelled while collecting. Sources are
+    context managers so archive handles are released when the job ends.
+    """
+
+    def collect(self, job, tmp_dir: str) -> Optional[List[SourcePage]]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalDirectorySource(ImageSource):
+    """Images already on this machine; read in place, nothing is copied to tmp_dir."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def collect(self, job, tmp_dir):
+        if not os.path.isdir(self.path):
+            raise FileNotFoundError(f"Directory not found: {self.path}")
+        pages = [
+            SourcePage(entry.name, path=entry.path)
+            for entry in os.scandir(self.path)
+            if entry.is_file() and is_image_name(entry.name)
+        ]
+        pages.sort(key=lambda p: natural_keys(p.name))
+        return pages
+
+
+class ZipArchiveSource(ImageSource):
+    """
+    ZIP/CBZ archive read in place.
+
+    Members are streamed (and decompressed on the fly) straight from the
+    archive on open(); nothing is extracted to disk. zipfile serialises access
+    to the shared handle, so pages can be opened from parallel OCR batches.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = None
+
+    def collect(self, job, tmp_dir):
+        self._zip = zipfile.ZipFile(self.path)
+
+        pages = []
+        for info in self._zip.infolist():
+            if job.is_cancelled():
+                return None
+            base_name = os.path.basename(info.filename)
+            # Skip directories and macOS resource-fork junk (__MACOSX/._page1.jpg)
+            if info.is_dir() or base_name.startswith("._") or not is_image_name(base_name):
+                continue
+            pages.append(SourcePage(
+                info.filename,
+                opener=lambda info=info: self._zip.open(info),
+                size=info.file_size
+            ))
+        pages.sort(key=lambda p: natural_keys(p.name))
+        return pages
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+            self._zip = None
+
+
+def open_local_source(spec: dict) -> ImageSource:
+    """Build a source for a non-Drive job payload: {"type": "local"|"archive", "path": ...}."""
+    source_type = spec.get("type")
+    if source_type == "local":
+        return LocalDirectorySource(spec["path"])
+    if source_type == "archive":
+        return ZipArchiveSource(spec["path"])
+    raise ValueError(f"Unknown image source type: {source_type}")
@@ -0,0 +1,407 @@
+import os
+import json
+import shutil
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Optional
+
+# Terminal job states: once a job reaches one of these, workers and the
+# progress stream stop touching it.
+TERMINAL_STATUSES = ("complete", "error", "cancelled")
+RUNNING_STATUSES = ("starting", "processing")
+
+# A claimed job whose worker hasn't heartbeated for LEASE_SECONDS is presumed
+# lost (worker crashed, or was terminated on API shutdown/--reload). It is
+# re-queued until it has been claimed MAX_ATTEMPTS times, then failed.
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+
+# Payload fields that are credentials; dropped from the row once the job ends
+SECRET_PAYLOAD_KEYS = ("api_key",)
+
+
+def strip_secrets(payload: dict) -> dict:
+    return {k: v for k, v in payload.items() if k not in SECRET_PAYLOAD_KEYS}
+
+
+def discard_job_files(payload: dict):
+    """Delete files the job owns (direct uploads); called whenever a job reaches a terminal state."""
+    if payload.get("cleanup_path"):
+        shutil.rmtree(payload["cleanup_path"], ignore_errors=True)
+
+
+class JobStore:
+    """
+    Durable job queue + state shared between the API and worker processes.
+
+    Everything that used to live in process memory (OAuth tokens, progress,
+    cancellation flag, output location) goes through this interface so that
+    any API process can answer for any job, whichever worker is running it.
+    Subclass and register in JOB_STORE_BACKENDS to plug in another backend.
+    """
+
+    def create_job(self, kind: str, payload: dict) -> str:
+        raise NotImplementedError
+
+    def claim_next_job(self, worker_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker_id: str):
+        """Renew `worker_id`'s lease on a running job."""
+        raise NotImplementedError
+
+    def release_job(self, job_id: str, worker_id: str):
+        """Give a claimed job back (worker shutting down): re-queue or fail it."""
+        raise NotImplementedError
+
+    def recover_stale_jobs(self):
+        """Re-queue or fail running jobs whose lease has expired."""
+        raise NotImplementedError
+
+    def fail_if_queued(self, job_id: str, error: str) -> bool:
+        """Fail a job nobody has claimed yet. Returns False if a worker got it first."""
+        raise NotImplementedError
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def latest_job(self, status: Optional[str] = None) -> Optional[dict]:
+        raise NotImplementedError
+
+    def update_progress(self, job_id: str, fields: dict):
+        raise NotImplementedError
+
+    def finish_job(self, job_id: str, result: dict, status: Optional[str] = None):
+        raise NotImplementedError
+
+    def request_cancel(self, job_id: str):
+        raise NotImplementedError
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def get_value(self, key: str):
+        raise NotImplementedError
+
+    def set_value(self, key: str, value):
+        raise NotImplementedError
+
+    def delete_value(self, key: str):
+        raise NotImplementedError
+
+    def list_values(self, prefix: str) -> dict:
+        raise NotImplementedError
+
+
+class SQLiteJobStore(JobStore):
+    """Default backend: a single SQLite file in WAL mode, safe across processes."""
+
+    # recover_stale_jobs is called from polling loops; sweep at most this often
+    RECOVERY_INTERVAL = 5.0
+
+    def __init__(self, path: str):
+        self.path = path
+        # One connection per thread; sqlite3 connections are not thread-safe
+        self._local = threading.local()
+        self._last_recovery = 0.0
+        # Holds OAuth tokens and API keys of pending jobs: owner-only. Create the
+        # file before SQLite opens it; SQLite gives -wal/-shm the database's mode
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.chmod(path + suffix, 0o600)
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                percent INTEGER NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                result TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                worker_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        # Added after the first release; migrate existing databases
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+        if "attempts" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    @staticmethod
+    def _row_to_job(row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def create_job(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, payload, status, message, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', 'Waiting for a worker...', ?, ?)",
+            (job_id, kind, json.dumps(payload), now, now)
+        )
+        return job_id
+
+    def claim_next_job(self, worker_id):
+        self.recover_stale_jobs()
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front so two workers can
+        # never claim the same queued row.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'starting', worker_id = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker_id, time.time(), row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job = self._row_to_job(row)
+        job["status"] = "starting"
+        job["worker_id"] = worker_id
+        job["attempts"] += 1
+        return job
+
+    def heartbeat(self, job_id, worker_id):
+        self._conn().execute(
+            "UPDATE jobs SET updated_at = ? WHERE id = ? AND worker_id = ? AND result IS NULL",
+            (time.time(), job_id, worker_id)
+        )
+
+    def _requeue_or_fail(self, conn, row, reason) -> bool:
+        # Caller holds the write transaction, and discards the job's files
+        # after committing when this returns True (job failed)
+        if row["attempts"] < MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, percent = 0, "
+                "message = ?, updated_at = ? WHERE id = ?",
+                (f"{reason}; waiting for another worker...", time.time(), row["id"])
+            )
+            return False
+        else:
+            error = f"{reason} (gave up after {row['attempts']} attempts)"
+            conn.execute(
+                "UPDATE jobs SET status = 'error', message = ?, result = ?, payload = ?, "
+                "updated_at = ? WHERE id = ?",
+                (error, json.dumps({"success": False, "error": error}),
+                 json.dumps(strip_secrets(json.loads(row["payload"]))), time.time(), row["id"])
+            )
+            return True
+
+    def release_job(self, job_id, worker_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND worker_id = ? AND result IS NULL",
+                (job_id, worker_id)
+            ).fetchone()
+            failed = row is not None and self._requeue_or_fail(conn, row, "Worker shut down")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if failed:
+            discard_job_files(json.loads(row["payload"]))
+
+    def recover_stale_jobs(self):
+        now = time.monotonic()
+        if now - self._last_recovery < self.RECOVERY_INTERVAL:
+            return
+        self._last_recovery = now
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({','.join('?' * len(RUNNING_STATUSES))}) "
+                "AND result IS NULL AND updated_at < ?",
+                (*RUNNING_STATUSES, time.time() - LEASE_SECONDS)
+            ).fetchall()
+            failed = [row for row in rows if self._requeue_or_fail(conn, row, "Worker stopped responding")]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for row in failed:
+            discard_job_files(json.loads(row["payload"]))
+
+    def fail_if_queued(self, job_id, error):
+        row = self._conn().execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return False
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = 'error', message = ?, result = ?, payload = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            (error, json.dumps({"success": False, "error": error}),
+             json.dumps(strip_secrets(json.loads(row["payload"]))), time.time(), job_id)
+        )
+        if cursor.rowcount != 1:
+            return False
+        discard_job_files(json.loads(row["payload"]))
+        return True
+
+    def get_job(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def latest_job(self, status=None):
+        if status:
+            row = self._conn().execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT 1", (status,)
+            ).fetchone()
+        else:
+            row = self._conn().execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT 1"
+            ).fetchone()
+        return self._row_to_job(row)
+
+    def update_progress(self, job_id, fields):
+        allowed = {k: fields[k] for k in ("status", "percent", "message") if k in fields}
+        if not allowed:
+            return
+        assignments = ", ".join(f"{k} = ?" for k in allowed)
+        # Never overwrite a terminal state (e.g. a late batch update after cancel)
+        self._conn().execute(
+            f"UPDATE jobs SET {assignments}, updated_at = ? "
+            f"WHERE id = ? AND status NOT IN ({','.join('?' * len(TERMINAL_STATUSES))})",
+            (*allowed.values(), time.time(), job_id, *TERMINAL_STATUSES)
+        )
+
+    def finish_job(self, job_id, result, status=None):
+        row = self._conn().execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return
+        # Credentials and uploads were only needed to run the job
+        discard_job_files(json.loads(row["payload"]))
+        payload = json.dumps(strip_secrets(json.loads(row["payload"])))
+        # Result is written last: the API treats a non-null result as "job done"
+        if status:
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, result = ?, payload = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result), payload, time.time(), job_id)
+            )
+        else:
+            self._conn().execute(
+                "UPDATE jobs SET result = ?, payload = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(result), payload, time.time(), job_id)
+            )
+
+    def request_cancel(self, job_id):
+        self._conn().execute(
+            "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?",
+            (time.time(), job_id)
+        )
+
+    def is_cancel_requested(self, job_id):
+        row = self._conn().execute(
+            "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def get_value(self, key):
+        row = self._conn().execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def set_value(self, key, value):
+        self._conn().execute(
+            "INSERT INTO kv (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value))
+        )
+
+    def delete_value(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def list_values(self, prefix):
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        ).fetchall()
+        return {row["key"]: json.loads(row["value"]) for row in rows}
+
+
+JOB_STORE_BACKENDS = {
+    "sqlite": lambda: SQLiteJobStore(os.getenv("JOB_STORE_PATH", "jobs.db")),
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Process-wide store instance, backend chosen by JOB_STORE_BACKEND (default: sqlite)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.getenv("JOB_STORE_BACKEND", "sqlite")
+            if backend not in JOB_STORE_BACKENDS:
+                raise ValueError(f"Unknown job store backend: {backend}")
+            _store = JOB_STORE_BACKENDS[backend]()
+        return _store
+
+
+class JobHandle:
+    """
+    What a running pipeline sees of its job: a progress sink and a cancel flag.
+
+    The cancel flag is polled from the store at most every `cancel_poll_interval`
+    seconds so tight loops (per streamed OCR chunk) don't hammer the database.
+    """
+
+    def __init__(self, store: JobStore, job_id: str, cancel_poll_interval: float = 0.5):
+        self.store = store
+        self.job_id = job_id
+        self.cancel_poll_interval = cancel_poll_interval
+        self._cancelled = False
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, fields: dict):
+        self.store.update_progress(self.job_id, fields)
+
+    def is_cancelled(self) -> bool:
+        with self._lock:
+            if self._cancelled:
+                return True
+            now = time.monotonic()
+            if now - self._last_poll >= self.cancel_poll_interval:
+                self._last_poll = now
+                self._cancelled = self.store.is_cancel_requested(self.job_id)
+            return self._cancelled
@@ -0,0 +1,123 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Optional
+from PIL import Image, ImageMode
+
+# Default process-wide budget for decoded pixel data in flight
+DEFAULT_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "2048"))
+
+
+def bytes_per_pixel(mode: str) -> int:
+    """In-memory pixel size for a Pillow mode (e.g. 2 for I;16, 4 for I/F/RGB)."""
+    try:
+        image_mode = ImageMode.getmode(mode)
+    except KeyError:
+        return 4  # Unknown/exotic mode: assume the widest common pixel
+    band_bytes = int(image_mode.typestr[2:])
+    bands = len(image_mode.bands)
+    # Pillow pads multi-band 8-bit pixels (RGB, LA, CMYK...) to 32 bits
+    if bands > 1 and band_bytes == 1:
+        return 4
+    return band_bytes * bands
+
+
+def estimate_decoded_size(page) -> int:
+    """
+    Decoded size of an image in bytes (width x height x bytes per pixel).
+
+    `page` is a path or anything with an open() returning a binary stream
+    (e.g. a SourcePage). Image.open only parses the header, so this is cheap
+    even for 40 MP scans; pixel data is never decoded here.
+    """
+    if hasattr(page, "open"):
+        with page.open() as stream, Image.open(stream) as img:
+            width, height = img.size
+            return width * height * bytes_per_pixel(img.mode)
+    with Image.open(page) as img:
+        width, height = img.size
+        return width * height * bytes_per_pixel(img.mode)
+
+
+class MemoryBudget:
+    """
+    Admission controller for decoded images.
+
+    Callers reserve the estimated decoded size of the pages they are about to
+    open and block until the budget has room. A single reservation larger than
+    the whole budget is still admitted once nothing else is in flight, so an
+    oversized page slows the job down instead of deadlocking it.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.in_use = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def _has_room(self, nbytes):
+        return self.in_flight == 0 or self.in_use + nbytes <= self.budget_bytes
+
+    def acquire(self, nbytes: int, cancel_callback=None) -> bool:
+        """Block until `nbytes` fit in the budget. Returns False if cancelled while waiting."""
+        with self._cond:
+            self.waiting += 1
+            try:
+                while not self._has_room(nbytes):
+                    if cancel_callback and cancel_callback():
+                        return False
+                    # Wake periodically to re-check cancellation
+                    self._cond.wait(timeout=0.5)
+                self.in_use += nbytes
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_use)
+            finally:
+                self.waiting -= 1
+        return True
+
+    def release(self, nbytes: int):
+        with self._cond:
+            self.in_use -= nbytes
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, pages: Iterable, cancel_callback=None):
+        """
+        Reserve the decoded size of `pages` for the duration of the block.
+        Yields False (without reserving) if cancelled while waiting for room.
+        """
+        nbytes = sum(estimate_decoded_size(p) for p in pages)
+        if not self.acquire(nbytes, cancel_callback):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self.release(nbytes)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "in_use_bytes": self.in_use,
+                "peak_bytes": self.peak,
+                "reservations_in_flight": self.in_flight,
+                "waiting": self.waiting,
+            }
+
+
+_budget: Optional[MemoryBudget] = None
+_budget_lock = threading.Lock()
+
+
+def get_memory_budget() -> MemoryBudget:
+    """Process-wide budget shared by every job running in this process."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = MemoryBudget(DEFAULT_BUDGET_MB * 1024 * 1024)
+        return _budget
+
@@ -0,0 +1,120 @@
+import os
+from io import BytesIO
+import pikepdf
+from fpdf import FPDF
+from PIL import Image, ImageStat
+
+# Pages are placed full-width on A4, so this is the physical width DPI targets refer to
+PAGE_WIDTH_MM = 210
+
+# dpi: downsample pages wider than this at PAGE_WIDTH_MM (None = embed the source file untouched)
+# jpeg_quality: re-encode colour/greyscale pages as JPEG at this quality
+# bilevel: encode pages detected as text-only as 1-bit (CCITT G4) images
+# object_streams: pack PDF objects into compressed object streams (via pikepdf)
+PDF_PROFILES = {
+    "original": {"dpi": None, "jpeg_quality": None, "bilevel": False, "object_streams": False},
+    "high": {"dpi": 300, "jpeg_quality": 90, "bilevel": False, "object_streams": True},
+    "balanced": {"dpi": 200, "jpeg_quality": 80, "bilevel": True, "object_streams": True},
+    "small": {"dpi": 150, "jpeg_quality": 60, "bilevel": True, "object_streams": True},
+}
+DEFAULT_PDF_PROFILE = os.getenv("DEFAULT_PDF_PROFILE", "balanced")
+
+# Text-only detection thresholds (on a small thumbnail)
+TEXT_MAX_SATURATION = 40      # mean HSV saturation (0-255); tolerates yellowed paper
+TEXT_MIN_EXTREME_RATIO = 0.95 # share of pixels that are clearly ink or clearly paper
+BILEVEL_THRESHOLD = 128
+
+
+def resolve_profiles(names) -> list:
+    """Validate requested profile names (str or list); defaults to DEFAULT_PDF_PROFILE."""
+    if not names:
+        return [DEFAULT_PDF_PROFILE]
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(",") if n.strip()]
+    unknown = [n for n in names if n not in PDF_PROFILES]
+    if unknown:
+        raise ValueError(f"Unknown PDF profile(s): {', '.join(unknown)}. Choose from {', '.join(PDF_PROFILES)}")
+    # Keep order, drop duplicates
+    return list(dict.fromkeys(names))
+
+
+def is_text_only(img: Image.Image) -> bool:
+    """
+    Colour analysis on a thumbnail: a page is text-only when it is (nearly)
+    unsaturated and almost every pixel is either ink or paper, with few midtones.
+    """
+    scale = 256 / max(img.size)
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    thumb = img.resize(size, Image.NEAREST).convert("RGB")
+
+    saturation = ImageStat.Stat(thumb.convert("HSV").getchannel("S")).mean[0]
+    if saturation > TEXT_MAX_SATURATION:
+        return False
+
+    hist = thumb.convert("L").histogram()
+    extremes = sum(hist[:64]) + sum(hist[192:])
+    return extremes / sum(hist) >= TEXT_MIN_EXTREME_RATIO
+
+
+def prepare_image(img: Image.Image, profile: dict, page_width_mm: float = PAGE_WIDTH_MM):
+    """Downsample/re-encode one decoded page for `profile`. Returns (image for pdf.image, image filter)."""
+    target_width = round(page_width_mm / 25.4 * profile["dpi"])
+    if img.width > target_width:
+        target_height = max(1, round(img.height * target_width / img.width))
+        img = img.resize((target_width, target_height), Image.LANCZOS)
+
+    if profile["bilevel"] and is_text_only(img):
+        bilevel = img.convert("L").point(lambda v: 255 if v >= BILEVEL_THRESHOLD else 0, mode="1")
+        # fpdf2 encodes mode "1" images as CCITT G4 itself under AUTO
+        return bilevel, "AUTO"
+
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=profile["jpeg_quality"], optimize=True)
+    buf.seek(0)
+    # Already JPEG: AUTO makes fpdf2 embed these bytes as-is
+    return buf, "AUTO"
+
+
+def add_page(targets, page, page_width_mm: float = PAGE_WIDTH_MM):
+    """
+    Append `page` (anything with open()) to each (pdf, profile) in `targets`.
+    The page is decoded at most once, however many profiles need it.
+    """
+    decoded = None
+    try:
+        for pdf, profile in targets:
+            pdf.add_page()
+            if profile["dpi"] is None:
+                with page.open() as stream:
+                    pdf.set_image_filter("AUTO")
+                    pdf.image(stream, x=0, y=0, w=page_width_mm)
+                continue
+
+            if decoded is None:
+                stream = page.open()
+                decoded = Image.open(stream)
+                decoded.load()
+                stream.close()
+            image, image_filter = prepare_image(decoded, profile, page_width_mm)
+            pdf.set_image_filter(image_filter)
+            pdf.image(image, x=0, y=0, w=page_width_mm)
+    finally:
+        if decoded is not None:
+            decoded.close()
+
+
+def write_pdf(pdf: FPDF, output_path: str, profile: dict) -> int:
+    """Write `pdf`, applying object-stream compression when the profile asks for it. Returns size in bytes."""
+    pdf.output(output_path)
+    if profile["object_streams"]:
+        tmp_path = f"{output_path}.tmp"
+        with pikepdf.open(output_path) as doc:
+            doc.save(
+                tmp_path,
+                object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                compress_streams=True,
+            )
+        os.replace(tmp_path, output_path)
+    return os.path.getsize(output_path)
@@ -0,0 +1,86 @@
+import os
+import re
+import math
+import base64
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from services.gemini_service import GeminiOCR
+
+logger = logging.getLogger(__name__)
+
+# Mirrors the OCR pipeline: up to 100 concurrent batches (Paid Tier), pages split evenly
+MAX_CONCURRENT_BATCHES = 100
+
+# Estimation knobs (override via env to match your tier/pricing)
+# Gemini 3 bills each image at a fixed budget set by its media resolution, not its pixel size
+IMAGE_TOKENS_PER_PAGE = int(os.getenv("GEMINI_IMAGE_TOKENS_PER_PAGE", "1120"))
+OUTPUT_TOKENS_PER_PAGE = int(os.getenv("GEMINI_OUTPUT_TOKENS_PER_PAGE", "700"))
+INPUT_PRICE_PER_M = float(os.getenv("GEMINI_INPUT_PRICE_PER_M", "0.50"))
+OUTPUT_PRICE_PER_M = float(os.getenv("GEMINI_OUTPUT_PRICE_PER_M", "3.00"))
+OCR_SECONDS_PER_PAGE = float(os.getenv("OCR_SECONDS_PER_PAGE", "15"))
+DOWNLOAD_BYTES_PER_SECOND = float(os.getenv("DOWNLOAD_BYTES_PER_SECOND", str(10 * 1024 * 1024)))
+DOWNLOAD_SECONDS_PER_FILE = 0.3  # Per-request overhead of get_media
+
+THUMBNAIL_WORKERS = 16
+DEFAULT_THUMBNAIL_SIZE = 220
+MIN_THUMBNAIL_SIZE = 32
+MAX_THUMBNAIL_SIZE = 400
+
+
+def fetch_thumbnails(files, access_token, size=DEFAULT_THUMBNAIL_SIZE):
+    """
+    Fetch Drive thumbnailLink renditions concurrently.
+
+    Returns {file_id: data URI}; files without a thumbnail (or whose fetch
+    fails) are simply missing, the preview still lists them.
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    def fetch(file_meta):
+        link = file_meta.get("thumbnailLink")
+        if not link:
+            return file_meta["id"], None
+        # Links end in =s<px>; ask Drive for the size we want
+        link = re.sub(r"=s\d+$", f"=s{size}", link)
+        try:
+            resp = requests.get(link, headers=headers, timeout=15)
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Thumbnail failed for {file_meta['name']}: {e}")
+            return file_meta["id"], None
+        mime = resp.headers.get("Content-Type", "image/png").split(";")[0]
+        return file_meta["id"], f"data:{mime};base64,{base64.b64encode(resp.content).decode()}"
+
+    with ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS) as executor:
+        return {file_id: uri for file_id, uri in executor.map(fetch, files) if uri}
+
+
+def estimate_ocr(page_count, total_bytes):
+    """Rough request/token/cost/runtime estimate for running the OCR pipeline on this folder."""
+    if page_count == 0:
+        return {"ocr_requests": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+                "download_seconds": 0, "ocr_seconds": 0, "total_seconds": 0}
+
+    batches = min(MAX_CONCURRENT_BATCHES, page_count)
+    largest_batch = math.ceil(page_count / batches)
+    # ~4 characters per token for the instruction prompt, sent once per batch
+    prompt_tokens = len(GeminiOCR.generate_prompt()) // 4
+
+    input_tokens = batches * prompt_tokens + page_count * IMAGE_TOKENS_PER_PAGE
+    output_tokens = page_count * OUTPUT_TOKENS_PER_PAGE
+    cost = input_tokens / 1e6 * INPUT_PRICE_PER_M + output_tokens / 1e6 * OUTPUT_PRICE_PER_M
+
+    # Downloads are sequential; batches all run at once, so OCR time is the largest batch
+    download_seconds = total_bytes / DOWNLOAD_BYTES_PER_SECOND + page_count * DOWNLOAD_SECONDS_PER_FILE
+    ocr_seconds = largest_batch * OCR_SECONDS_PER_PAGE
+    return {
+        "ocr_requests": batches,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": round(cost, 4),
+        "download_seconds": round(download_seconds),
+        "ocr_seconds": round(ocr_seconds),
+        "total_seconds": round(download_seconds + ocr_seconds),
+    }
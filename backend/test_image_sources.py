@@ -0,0 +1,73 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import main
+from services.image_sources import ZipArchiveSource, LocalDirectorySource
+
+
+class FakeJob:
+    def __init__(self, cancelled=False):
+        self.cancelled = cancelled
+
+    def is_cancelled(self):
+        return self.cancelled
+
+
+def make_archive(path, members):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+def test_zip_source_skips_junk_and_sorts_naturally(tmp_path):
+    archive = tmp_path / "book.cbz"
+    make_archive(archive, {
+        "page10.jpg": b"ten",
+        "page2.jpg": b"two",
+        "page1.JPG": b"one",
+        "__MACOSX/._page2.jpg": b"resource fork",
+        "chapter/": b"",
+        "ComicInfo.xml": b"<xml/>",
+    })
+
+    with ZipArchiveSource(str(archive)) as source:
+        pages = source.collect(FakeJob(), str(tmp_path))
+        assert [p.name for p in pages] == ["page1.JPG", "page2.jpg", "page10.jpg"]
+        assert [p.size for p in pages] == [3, 3, 3]
+        with pages[1].open() as stream:
+            assert stream.read() == b"two"
+
+
+def test_zip_source_stops_when_cancelled(tmp_path):
+    archive = tmp_path / "book.zip"
+    make_archive(archive, {"page1.png": b"x"})
+
+    with ZipArchiveSource(str(archive)) as source:
+        assert source.collect(FakeJob(cancelled=True), str(tmp_path)) is None
+
+
+def test_local_source_reads_in_place(tmp_path):
+    for name in ("p10.png", "p9.png", "notes.txt"):
+        (tmp_path / name).write_bytes(b"data")
+
+    pages = LocalDirectorySource(str(tmp_path)).collect(FakeJob(), str(tmp_path))
+    assert [p.name for p in pages] == ["p9.png", "p10.png"]
+    assert pages[0].path == str(tmp_path / "p9.png")
+
+
+def test_upload_rejects_duplicate_names(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_DIR", str(tmp_path))
+    files = [
+        UploadFile(io.BytesIO(b"a"), filename="vol1/page1.png"),
+        UploadFile(io.BytesIO(b"b"), filename="vol2/page1.png"),
+    ]
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main.convert_upload(files=files, mode="pdf", api_key=None, profile=None, wait=False))
+    assert exc.value.status_code == 400
+    # The partial upload is removed
+    assert list(tmp_path.iterdir()) == []
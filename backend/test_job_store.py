@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+
+import pytest
+
+from services import job_store
+from services.job_store import SQLiteJobStore, JobHandle
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+
+def test_only_one_worker_claims_a_job(store):
+    job_id = store.create_job("pdf", {"url": "x"})
+    claims = []
+
+    def claim(worker_id):
+        job = store.claim_next_job(worker_id)
+        if job:
+            claims.append(job)
+
+    threads = [threading.Thread(target=claim, args=(f"w{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(claims) == 1
+    assert claims[0]["id"] == job_id
+    assert store.get_job(job_id)["worker_id"] == claims[0]["worker_id"]
+
+
+def test_progress_cannot_overwrite_terminal_state(store):
+    job_id = store.create_job("pdf", {"url": "x"})
+    store.claim_next_job("w1")
+    store.finish_job(job_id, {"success": False}, status="cancelled")
+
+    store.update_progress(job_id, {"status": "processing", "percent": 90, "message": "late batch"})
+
+    job = store.get_job(job_id)
+    assert job["status"] == "cancelled"
+    assert job["percent"] == 0
+
+
+def test_finish_job_strips_secrets(store):
+    job_id = store.create_job("ocr", {"url": "x", "api_key": "secret"})
+    store.claim_next_job("w1")
+    store.finish_job(job_id, {"success": True})
+
+    assert store.get_job(job_id)["payload"] == {"url": "x"}
+    raw = store._conn().execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert "secret" not in raw
+
+
+def _expire_lease(store, job_id):
+    store._conn().execute(
+        "UPDATE jobs SET updated_at = ? WHERE id = ?",
+        (time.time() - job_store.LEASE_SECONDS - 1, job_id)
+    )
+    store._last_recovery = 0.0
+
+
+def test_expired_lease_requeues_then_fails(store, monkeypatch):
+    monkeypatch.setattr(job_store, "MAX_ATTEMPTS", 2)
+    job_id = store.create_job("ocr", {"url": "x", "api_key": "secret"})
+
+    store.claim_next_job("w1")
+    _expire_lease(store, job_id)
+    store.recover_stale_jobs()
+    assert store.get_job(job_id)["status"] == "queued"
+
+    assert store.claim_next_job("w2")["id"] == job_id
+    _expire_lease(store, job_id)
+    store.recover_stale_jobs()
+
+    job = store.get_job(job_id)
+    assert job["status"] == "error"
+    assert job["result"]["success"] is False
+    assert "api_key" not in job["payload"]
+
+
+def test_heartbeat_keeps_lease(store):
+    job_id = store.create_job("pdf", {"url": "x"})
+    store.claim_next_job("w1")
+    _expire_lease(store, job_id)
+    store.heartbeat(job_id, "w1")
+    store.recover_stale_jobs()
+
+    assert store.get_job(job_id)["status"] == "starting"
+
+
+def test_release_job_requeues(store):
+    job_id = store.create_job("pdf", {"url": "x"})
+    store.claim_next_job("w1")
+    store.release_job(job_id, "w1")
+
+    job = store.get_job(job_id)
+    assert job["status"] == "queued"
+    assert job["worker_id"] is None
+
+
+def test_fail_if_queued_loses_to_claim(store):
+    job_id = store.create_job("pdf", {"url": "x"})
+    store.claim_next_job("w1")
+
+    assert store.fail_if_queued(job_id, "no worker") is False
+    assert store.get_job(job_id)["status"] == "starting"
+
+    other_id = store.create_job("pdf", {"url": "y"})
+    assert store.fail_if_queued(other_id, "no worker") is True
+    assert store.get_job(other_id)["result"] == {"success": False, "error": "no worker"}
+
+
+def test_job_handle_sees_cancel(store):
+    job_id = store.create_job("pdf", {"url": "x"})
+    handle = JobHandle(store, job_id, cancel_poll_interval=0)
+    assert not handle.is_cancelled()
+
+    store.request_cancel(job_id)
+    assert handle.is_cancelled()
+
+
+def test_kv_roundtrip(store):
+    store.set_value("memory_budget:a", {"n": 1})
+    store.set_value("memory_budget:b", {"n": 2})
+    store.set_value("other", {"n": 3})
+
+    assert store.list_values("memory_budget:") == {"memory_budget:a": {"n": 1}, "memory_budget:b": {"n": 2}}
+    store.delete_value("memory_budget:a")
+    assert store.get_value("memory_budget:a") is None
+    assert store.get_value("other") == {"n": 3}
+
+
+def test_database_files_are_owner_only(store):
+    store.set_value("user_tokens:default", {"refresh_token": "SECRET"})
+
+    for suffix in ("", "-wal", "-shm"):
+        assert os.stat(store.path + suffix).st_mode & 0o777 == 0o600
+
+
+def test_terminal_states_discard_uploads(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(job_store, "MAX_ATTEMPTS", 1)
+    uploads = []
+    for name in ("finished", "unclaimed", "expired"):
+        path = tmp_path / name
+        path.mkdir()
+        uploads.append(path)
+    finished, unclaimed, expired = (
+        store.create_job("pdf", {"cleanup_path": str(path)}) for path in uploads
+    )
+
+    store.claim_next_job("w1")
+    store.finish_job(finished, {"success": True})
+    store.fail_if_queued(unclaimed, "no worker")
+    store.claim_next_job("w1")
+    _expire_lease(store, expired)
+    store.recover_stale_jobs()
+
+    assert store.get_job(expired)["status"] == "error"
+    assert not any(path.exists() for path in uploads)
+
+
+def test_requeued_job_keeps_uploads(store, tmp_path):
+    upload = tmp_path / "upload"
+    upload.mkdir()
+    job_id = store.create_job("pdf", {"cleanup_path": str(upload)})
+    store.claim_next_job("w1")
+    store.release_job(job_id, "w1")
+
+    assert upload.exists()
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from PIL import Image
+
+from services.memory_budget import MemoryBudget, bytes_per_pixel, estimate_decoded_size
+
+
+def test_acquire_blocks_until_release():
+    budget = MemoryBudget(100)
+    assert budget.acquire(80)
+
+    admitted = threading.Event()
+
+    def second():
+        budget.acquire(50)
+        admitted.set()
+
+    t = threading.Thread(target=second)
+    t.start()
+    time.sleep(0.1)
+    assert not admitted.is_set()
+    assert budget.stats()["waiting"] == 1
+
+    budget.release(80)
+    t.join(timeout=2)
+    assert admitted.is_set()
+    assert budget.stats()["in_use_bytes"] == 50
+
+
+def test_oversized_reservation_admitted_when_idle():
+    budget = MemoryBudget(100)
+    assert budget.acquire(500)
+    assert budget.stats()["in_use_bytes"] == 500
+    budget.release(500)
+    assert budget.stats()["in_use_bytes"] == 0
+    assert budget.stats()["peak_bytes"] == 500
+
+
+def test_acquire_returns_false_when_cancelled():
+    budget = MemoryBudget(100)
+    budget.acquire(100)
+
+    cancelled = threading.Event()
+    result = []
+    t = threading.Thread(target=lambda: result.append(budget.acquire(10, cancel_callback=cancelled.is_set)))
+    t.start()
+    cancelled.set()
+    t.join(timeout=2)
+
+    assert result == [False]
+    stats = budget.stats()
+    assert stats["in_use_bytes"] == 100
+    assert stats["waiting"] == 0
+
+
+def test_bytes_per_pixel_counts_bit_depth():
+    assert bytes_per_pixel("L") == 1
+    assert bytes_per_pixel("I;16") == 2
+    assert bytes_per_pixel("I") == 4
+    assert bytes_per_pixel("F") == 4
+    assert bytes_per_pixel("RGB") == 4
+
+
+def test_estimate_decoded_size_from_header(tmp_path):
+    path = tmp_path / "scan.png"
+    Image.new("I;16", (30, 20)).save(path)
+    assert estimate_decoded_size(str(path)) == 30 * 20 * 2
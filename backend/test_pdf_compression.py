@@ -0,0 +1,80 @@
+import pikepdf
+import pytest
+from fpdf import FPDF
+from PIL import Image, ImageDraw
+
+from services.image_sources import SourcePage
+from services.pdf_compression import PDF_PROFILES, DEFAULT_PDF_PROFILE, resolve_profiles, prepare_image, add_page, write_pdf
+
+
+def text_page(size=(1200, 1600)):
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(100, size[1] - 100, 40):
+        draw.rectangle((100, y, size[0] - 100, y + 12), fill="black")
+    return img
+
+
+def photo_page(size=(1200, 1600)):
+    img = Image.new("RGB", size)
+    img.putdata([((x * 7) % 256, (x * 3) % 256, 128) for x in range(size[0] * size[1])])
+    return img
+
+
+def image_filters(path):
+    with pikepdf.open(path) as doc:
+        return [
+            str(xobject.get("/Filter"))
+            for page in doc.pages
+            for xobject in page.Resources.XObject.values()
+        ]
+
+
+def test_resolve_profiles_defaults_and_dedupes():
+    assert resolve_profiles(None) == [DEFAULT_PDF_PROFILE]
+    assert resolve_profiles("small, balanced,small") == ["small", "balanced"]
+    assert resolve_profiles(["high", "high"]) == ["high"]
+
+
+def test_resolve_profiles_rejects_unknown():
+    with pytest.raises(ValueError, match="tiny"):
+        resolve_profiles(["balanced", "tiny"])
+
+
+def test_prepare_image_downsamples_to_target_dpi():
+    image, _ = prepare_image(Image.new("RGB", (3000, 4000), (200, 30, 30)), PDF_PROFILES["small"])
+    assert Image.open(image).width == round(210 / 25.4 * 150)
+
+
+def test_text_page_is_ccitt_encoded(tmp_path):
+    path = tmp_path / "text.png"
+    text_page().save(path)
+    pdf = FPDF()
+    add_page([(pdf, PDF_PROFILES["balanced"])], SourcePage("text.png", path=str(path)))
+
+    output = str(tmp_path / "out.pdf")
+    write_pdf(pdf, output, PDF_PROFILES["balanced"])
+    assert image_filters(output) == ["/CCITTFaxDecode"]
+
+
+def test_photo_page_is_jpeg_encoded(tmp_path):
+    path = tmp_path / "photo.png"
+    photo_page((400, 500)).save(path)
+    pdf = FPDF()
+    add_page([(pdf, PDF_PROFILES["balanced"])], SourcePage("photo.png", path=str(path)))
+
+    output = str(tmp_path / "out.pdf")
+    write_pdf(pdf, output, PDF_PROFILES["balanced"])
+    assert image_filters(output) == ["/DCTDecode"]
+
+
+def test_write_pdf_generates_object_streams(tmp_path):
+    pdf = FPDF()
+    pdf.add_page()
+    output = str(tmp_path / "out.pdf")
+    size = write_pdf(pdf, output, PDF_PROFILES["small"])
+
+    with open(output, "rb") as f:
+        data = f.read()
+    assert size == len(data)
+    assert b"/ObjStm" in data
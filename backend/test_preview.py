@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from services import preview
+from services.preview import estimate_ocr
+
+
+class FakeJob:
+    def is_cancelled(self):
+        return False
+
+
+def test_estimate_ocr_empty_folder():
+    estimate = estimate_ocr(0, 0)
+    assert estimate["ocr_requests"] == 0
+    assert estimate["cost_usd"] == 0
+
+
+def test_estimate_ocr_batches_like_pipeline():
+    prompt_tokens = len(main.GeminiOCR.generate_prompt()) // 4
+
+    small = estimate_ocr(10, 0)
+    assert small["ocr_requests"] == 10
+    assert small["input_tokens"] == 10 * prompt_tokens + 10 * preview.IMAGE_TOKENS_PER_PAGE
+    assert small["output_tokens"] == 10 * preview.OUTPUT_TOKENS_PER_PAGE
+
+    # 250 pages -> 100 concurrent batches, the largest holding 3 pages
+    large = estimate_ocr(250, 0)
+    assert large["ocr_requests"] == 100
+    assert large["ocr_seconds"] == round(3 * preview.OCR_SECONDS_PER_PAGE)
+
+
+def test_estimate_ocr_runtime_includes_download():
+    estimate = estimate_ocr(1, int(preview.DOWNLOAD_BYTES_PER_SECOND * 10))
+    assert estimate["download_seconds"] == round(10 + preview.DOWNLOAD_SECONDS_PER_FILE)
+    assert estimate["total_seconds"] == estimate["download_seconds"] + estimate["ocr_seconds"]
+
+
+def test_preview_rejects_non_numeric_thumbnail_size():
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main.preview_folder({"url": "folder", "thumbnail_size": "big"}))
+    assert exc.value.status_code == 400
+
+
+def test_drive_source_sorts_naturally(monkeypatch, tmp_path):
+    async def fake_download(job, service, folder_id, tmp_dir):
+        # Drive's orderBy=name is lexical
+        return [{"name": n, "path": str(tmp_path / n)} for n in ("page1.jpg", "page10.jpg", "page2.jpg")]
+
+    for name in ("page1.jpg", "page10.jpg", "page2.jpg"):
+        (tmp_path / name).write_bytes(b"x")
+    monkeypatch.setattr(main, "download_images_from_folder", fake_download)
+
+    pages = main.DriveFolderSource(None, "folder").collect(FakeJob(), str(tmp_path))
+    assert [p.name for p in pages] == ["page1.jpg", "page2.jpg", "page10.jpg"]
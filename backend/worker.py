@@ -0,0 +1,150 @@
+import os
+import time
+import signal
+import socket
+import threading
+import logging
+import argparse
+import multiprocessing
+
+from services.job_store import get_job_store, JobHandle, TERMINAL_STATUSES, LEASE_SECONDS
+from services.memory_budget import get_memory_budget
+
+# kv prefix under which each worker publishes its memory budget usage, how
+# often it does so, and when readers should treat an entry as a dead worker's
+MEMORY_STATS_PREFIX = "memory_budget:"
+MEMORY_STATS_INTERVAL = 5.0
+MEMORY_STATS_STALE_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+# How long an idle worker sleeps between queue polls
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))
+# Renew the job lease well before it expires
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4
+
+
+def _heartbeat_loop(store, job_id, worker_id, stop):
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            store.heartbeat(job_id, worker_id)
+        except Exception as e:
+            logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+
+
+def run_job(store, job):
+    # Imported lazily: main imports this module for the embedded pool
+    from main import process_conversion, process_ocr_conversion
+
+    handle = JobHandle(store, job["id"])
+    payload = job["payload"]
+    # Long OCR batches can go minutes without a progress update; keep the
+    # lease alive independently so the job isn't presumed lost
+    stop_heartbeat = threading.Event()
+    threading.Thread(
+        target=_heartbeat_loop, args=(store, job["id"], job["worker_id"], stop_heartbeat), daemon=True
+    ).start()
+    try:
+        if job["kind"] == "pdf":
+            result = process_conversion(handle, payload)
+        elif job["kind"] == "ocr":
+            result = process_ocr_conversion(handle, payload)
+        else:
+            result = {"success": False, "error": f"Unknown job kind: {job['kind']}"}
+    except Exception as e:
+        logger.error(f"Job {job['id']} crashed: {e}")
+        result = {"success": False, "error": str(e)}
+    finally:
+        stop_heartbeat.set()
+
+    # Pipelines report cancellation as an error; make the final state explicit
+    status = None
+    if not result.get("success") and store.is_cancel_requested(job["id"]):
+        status = "cancelled"
+    elif store.get_job(job["id"])["status"] not in TERMINAL_STATUSES:
+        status = "complete" if result.get("success") else "error"
+        if status == "error":
+            store.update_progress(job["id"], {"message": result.get("error", "")})
+    store.finish_job(job["id"], result, status=status)
+
+
+def _publish_memory_stats(store, key, stop):
+    budget = get_memory_budget()
+    while True:
+        try:
+            store.set_value(key, {**budget.stats(), "updated_at": time.time()})
+        except Exception as e:
+            logger.warning(f"Publishing memory stats failed: {e}")
+        if stop.wait(MEMORY_STATS_INTERVAL):
+            return
+
+
+def _exit_on_sigterm(signum, frame):
+    # Turn terminate() into a normal exit so run_worker's cleanup runs
+    raise SystemExit(0)
+
+
+def run_worker():
+    """Worker process main loop: claim the oldest queued job, run it, repeat."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    store = get_job_store()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Worker {worker_id} started.")
+
+    # Publish this process's decoded-image budget use so the API can report it
+    stats_key = f"{MEMORY_STATS_PREFIX}{worker_id}"
+    stop_stats = threading.Event()
+    threading.Thread(target=_publish_memory_stats, args=(store, stats_key, stop_stats), daemon=True).start()
+    job = None
+    try:
+        while True:
+            job = store.claim_next_job(worker_id)
+            if job is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            logger.info(f"Worker {worker_id} picked up {job['kind']} job {job['id']}")
+            run_job(store, job)
+            job = None
+    finally:
+        # Hand an interrupted job back right away instead of waiting for its lease to expire
+        if job is not None:
+            store.release_job(job["id"], worker_id)
+            logger.info(f"Worker {worker_id} released job {job['id']}")
+        stop_stats.set()
+        store.delete_value(stats_key)
+
+
+def start_worker_pool(count):
+    # Spawn (not fork) so children never inherit the parent's SQLite connection
+    ctx = multiprocessing.get_context("spawn")
+    workers = []
+    for _ in range(count):
+        p = ctx.Process(target=run_worker, daemon=True)
+        p.start()
+        workers.append(p)
+    return workers
+
+
+def stop_worker_pool(workers):
+    for p in workers:
+        p.terminate()
+    for p in workers:
+        p.join(timeout=5)
+        # Stuck in a long batch: kill it; the job lease expires and it is re-queued
+        if p.is_alive():
+            p.kill()
+            p.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run conversion workers against the shared job store.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workers = start_worker_pool(args.workers)
+    try:
+        for p in workers:
+            p.join()
+    except KeyboardInterrupt:
+        stop_worker_pool(workers)